@@ -1,4 +1,5 @@
 import argparse
+import itertools
 import logging
 import os
 import platform
@@ -8,8 +9,7 @@ import threading
 import queue    
 import tkinter as tk
 from tkinter import ttk
-import requests
-from io import BytesIO
+import listings
 from PIL import Image, ImageTk
 from bs4 import BeautifulSoup
 from selenium import webdriver
@@ -26,6 +26,7 @@ parser = argparse.ArgumentParser(description='LPS Pet Search Application V1.0')
 parser.add_argument('-d', action='store_true', help='Enable basic debug logging')
 parser.add_argument('-a', action='store_true', help='Enable advanced debug logging')
 parser.add_argument('--browser', choices=['chrome', 'firefox'], help='Specify the browser to use (default is determined by OS)')
+parser.add_argument('--watch-interval', type=int, default=30, help='Minutes between watchlist polls of the same query (default 30)')
 args = parser.parse_args()
 
 # Determine default browser based on the operating system
@@ -54,6 +55,14 @@ else:
 
 logger = logging.getLogger(__name__)
 
+# Lazy image loading, distances are in screens (canvas heights) from the viewport
+PREFETCH_SCREENS = 1.0      # Rows this close to the viewport are prefetched
+CANCEL_SCREENS = 3.0        # Pending loads further away than this are cancelled
+MAX_LOADED_IMAGES = 150     # PhotoImages kept alive before far offscreen rows are released
+
+LISTINGS_PER_TICK = 25      # Listings added to the GUI per process_queue call
+MAX_ALERT_ROWS = 50         # Watchlist alert rows kept on screen, oldest dropped first
+
 class LPSSearchApp:
     def __init__(self, master):
         self.master = master
@@ -62,9 +71,12 @@ class LPSSearchApp:
 
         # Queue for safely passing results between threads and the GUI
         self.log_queue = queue.Queue()
-        self.result_queue = queue.Queue()
+        self.result_queue = listings.ResultChannel()   # Bounded, scrapers block when the GUI falls behind
         self.stop_event = threading.Event()
         self.search_thread = None
+        # Watchlist alerts come from their own background scheduler
+        self.alert_queue = queue.Queue()
+        self.watch_stop_event = threading.Event()
         # Handle window closing
         self.master.protocol("WM_DELETE_WINDOW", self.on_closing)
 
@@ -87,6 +99,18 @@ class LPSSearchApp:
         self.clear_button = ttk.Button(self.search_frame, text="Clear", command=self.clear_search)
         self.clear_button.grid(row=0, column=2, padx=(10, 0))
 
+        # Watch button, adds the current query to the watchlist
+        self.watch_button = ttk.Button(self.search_frame, text="Watch", command=self.watch_search)
+        self.watch_button.grid(row=0, column=3, padx=(10, 0))
+
+        # Unwatch button, removes the current query from the watchlist
+        self.unwatch_button = ttk.Button(self.search_frame, text="Unwatch", command=self.unwatch_search)
+        self.unwatch_button.grid(row=0, column=4, padx=(10, 0))
+
+        # Watched queries and watchlist alerts summary
+        self.watch_label = ttk.Label(self.search_frame, text="")
+        self.watch_label.grid(row=1, column=0, columnspan=5, sticky="w", pady=(5, 0))
+
         # Scrollable area
         self.canvas = tk.Canvas(master)
         self.canvas.configure(background='#f6d7da')
@@ -94,11 +118,21 @@ class LPSSearchApp:
         
         self.scrollbar = ttk.Scrollbar(master, orient=tk.VERTICAL, command=self.canvas.yview)
         self.scrollbar.grid(row=1, column=1, sticky="ns")
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.configure(yscrollcommand=self.on_canvas_scroll)
+        self.canvas.bind("<Configure>", lambda event: self.schedule_image_update())
 
         self.scrollable_frame = ttk.Frame(self.canvas)
         self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
 
+        # Watchlist alerts sit above the search results and survive new searches
+        self.alerts_frame = ttk.Frame(self.scrollable_frame)
+        self.alerts_frame.pack(fill=tk.X)
+        self.alerts_header = ttk.Label(self.alerts_frame, text="Watchlist alerts", font=("Helvetica", 12, "bold"))
+        self.alert_rows = []    # Alert listing frames, newest first
+        self.alert_counts = {}  # query -> alerts seen this session
+        self.results_frame = ttk.Frame(self.scrollable_frame)
+        self.results_frame.pack(fill=tk.X)
+
         # Enable mouse wheel scrolling anywhere within the canvas
         self.canvas.bind_all("<MouseWheel>", self.on_mouse_wheel)
 
@@ -106,6 +140,21 @@ class LPSSearchApp:
         self.canvas.bind("<ButtonPress-1>", self.on_drag_start)
         self.canvas.bind("<B1-Motion>", self.on_drag_motion)
 
+        # Listing images are loaded in the background, visible rows first
+        import image_loader
+        self.image_loader = image_loader.ImageLoader()
+        self.image_rows = {}    # row_id -> {"label", "frame", "img_url", "state"}, state is empty/pending/loaded/failed
+        self.row_ids = itertools.count()
+        self.image_update_pending = False
+        self.placeholder_image = ImageTk.PhotoImage(Image.new("RGB", (100, 100), color="grey"))
+
+        # Start polling the watchlist in the background
+        import watchlist
+        self.watchlist = watchlist.Watchlist()
+        self.watch_scheduler = watchlist.WatchlistScheduler(self.watchlist, self.alert_queue, self.watch_stop_event, args.browser)
+        self.watch_scheduler.start()
+        self.show_watchlist()
+
         # Start processing results from the queue
         self.master.after(100, self.process_queue)
     
@@ -171,6 +220,7 @@ class LPSSearchApp:
     def on_closing(self):
         logger.info("Closing application...")
         self.stop_search()
+        self.watch_stop_event.set()
         
         # Wait for the search thread to finish
         if self.search_thread and self.search_thread.is_alive():
@@ -179,12 +229,16 @@ class LPSSearchApp:
             if self.search_thread.is_alive():
                 logger.warning("Search thread did not finish in time.")
         
+        # Let the watchlist poller finish its current poll, then quit the browsers
+        if self.watch_scheduler.is_alive():
+            self.watch_scheduler.join(timeout=5)
+            if self.watch_scheduler.is_alive():
+                logger.warning("Watchlist poller did not finish in time.")
+        import ebay_scraper
+        ebay_scraper.quit_drivers()
+
         # Clear the result queue
-        while not self.result_queue.empty():
-            try:
-                self.result_queue.get_nowait()
-            except queue.Empty:
-                break
+        self.result_queue.clear()
 
         logger.info("Application shutdown complete.")
         self.listener.stop()
@@ -198,6 +252,11 @@ class LPSSearchApp:
         else: 
             self.canvas.yview_scroll(1, "units")   # Scroll down
 
+    def on_canvas_scroll(self, first, last):
+        """Keep the scrollbar in sync and reprioritize images for the new viewport."""
+        self.scrollbar.set(first, last)
+        self.schedule_image_update()
+
     def on_drag_start(self, event):
         """Start the drag event for scrolling."""
         self.drag_start_y = event.y
@@ -208,62 +267,124 @@ class LPSSearchApp:
         self.canvas.yview_scroll(delta_y // 10, "units")  # Adjust the scrolling speed
         self.drag_start_y = event.y    
     
-    def search_pets(self, event=None):
-         # Cancel any ongoing search
-        self.stop_event.set()
-        self.stop_event.clear()  # Reset for the new search
+    def get_query(self):
+        """Return the search entry text as an eBay query, or None if empty."""
         query = self.search_entry.get().strip()
         
         if not query:
             logger.warning("Search query is empty.")
-            return
+            return None
         try:
             int(query)
             query = "LPS " + query
         except ValueError:
             logger.debug("QUERY IS NOT A NUMBER")
+        return query
+
+    def watch_search(self):
+        """Add the current query to the watchlist."""
+        query = self.get_query()
+        if query is None:
+            return
+        self.watchlist.add(query, args.watch_interval * 60)
+        self.show_watchlist()
+
+    def unwatch_search(self):
+        """Remove the current query from the watchlist."""
+        query = self.get_query()
+        if query is None:
+            return
+        if not self.watchlist.remove(query):
+            logger.warning(f"Not watching: {query}")
+        self.show_watchlist()
+
+    def show_watchlist(self):
+        """List the watched queries, with the number of alerts each has raised."""
+        queries = []
+        for query in self.watchlist.queries():
+            count = self.alert_counts.get(query)
+            queries.append(f"{query} ({count} alert{'s' if count > 1 else ''})" if count else query)
+        self.watch_label.config(text=f"Watching: {', '.join(queries)}" if queries else "")
+
+    def search_pets(self, event=None):
+        # Cancel any ongoing search, its producer sees its own event set and stops
+        self.stop_event.set()
+        self.stop_event = threading.Event()  # Fresh event for the new search
+        query = self.get_query()
+        if query is None:
+            return
         
         logger.info(f"Searching for: {query}")
 
-        # Clear previous results
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
+        # Clear previous results, watchlist alerts stay
+        self.drop_listings(self.results_frame.winfo_children())
+        # Fresh channel too, so a cancelled producer that is still finishing a put cannot mix in stale listings
+        self.result_queue = listings.ResultChannel()
 
-        # Launch thread for eBay search
-        import ebay_scraper
-        self.stop_event.clear()  # Reset the stop event before starting a new search
-        self.search_thread = threading.Thread(target=ebay_scraper.search_ebay, args=(query, self.result_queue, self.stop_event, args.browser), daemon=True)
+        # Launch thread for eBay search, it goes through the shared scraper daemon if one is running
+        import scraper_daemon
+        self.search_thread = threading.Thread(target=scraper_daemon.search, args=(query, self.result_queue, self.stop_event, args.browser), daemon=True)
         self.search_thread.start()
     
-    def search_thread_function(self, query):
-        try:
-            ebay_scraper.search_ebay(query, self.result_queue, self.stop_event, args.browser)
-        except Exception as e:
-            logger.error(f"Error in search thread: {e}")
-        finally:
-            # Signal that the search is complete
-            self.result_queue.put(None)
-            
     def process_queue(self):
         listing_cnt = 0
         try:
-            while True:
-                result = self.result_queue.get_nowait()
+            # A bounded batch per call keeps the GUI responsive, the rest waits in the channel
+            for result in self.result_queue.get_batch(LISTINGS_PER_TICK):
                 if result is None:
-                    # Search is complete
+                    # Search is complete, keep the rest of the batch
                     logger.info("Search completed.")
-                    break
-                source, title, price, img_url, link = result    # extract useful information into variables thru thread-queue result
+                    continue
                 listing_cnt += 1
-                logger.debug(f"Listing #{listing_cnt}\nSource: {source}\tTitle: {title}\tPrice: {price}\n\tImage URL: {img_url}\n\tLink: {link}")
-                self.add_listing(source, title, price, img_url, link)
-        except queue.Empty:
-            pass
+                logger.debug(f"Listing #{listing_cnt}\nSource: {result.source}\tTitle: {result.title}\tPrice: {result.price}\n\tImage URL: {result.img_url}\n\tLink: {result.link}\n\tRecord size: {result.memory_size()} bytes")
+                self.add_listing(result)
         finally:
+            self.process_alerts()
+            self.process_images()
             # Schedule the next queue check
             self.master.after(100, self.process_queue)
 
-    def add_listing(self, source, title, price, img_url, link):
+    def process_alerts(self):
+        """Show new and price-dropped listings found by the watchlist."""
+        alert_cnt = 0
+        try:
+            while True:
+                kind, query, listing, old_price = self.alert_queue.get_nowait()
+                if kind == "price_drop":
+                    label = f"[PRICE DROP {old_price} -> {listing.price}] {query}:"
+                else:
+                    label = f"[NEW] {query}:"
+                alert_cnt += 1
+                self.alert_counts[query] = self.alert_counts.get(query, 0) + 1
+                logger.debug(f"Watchlist alert ({query}) #{listing.item_id}: {label} {listing.title}")
+                if not self.alert_rows:
+                    self.alerts_header.pack(anchor="w")
+                outer_frame = self.add_listing(listing, label, parent=self.alerts_frame)
+                if self.alert_rows:
+                    outer_frame.pack_configure(before=self.alert_rows[0])  # Newest on top
+                self.alert_rows.insert(0, outer_frame)
+        except queue.Empty:
+            pass
+        if alert_cnt:
+            if len(self.alert_rows) > MAX_ALERT_ROWS:
+                self.drop_listings(self.alert_rows[MAX_ALERT_ROWS:])
+                del self.alert_rows[MAX_ALERT_ROWS:]
+            self.show_watchlist()
+
+    def drop_listings(self, frames):
+        """Destroy listing rows and forget their pending or loaded images."""
+        frames = set(frames)
+        for row_id in [row_id for row_id, row in self.image_rows.items() if row["frame"] in frames]:
+            self.image_loader.cancel(row_id)
+            del self.image_rows[row_id]
+        for frame in frames:
+            frame.destroy()
+
+    def add_listing(self, listing, label=None, parent=None):
+        """Add a listing row to parent (the search results by default) and return its frame."""
+        source, title, price, img_url, link = listing.source, listing.title, listing.price, listing.img_url, listing.link
+        if label:
+            title = f"{label} {title}"
         # Define a style for the frame
         style = ttk.Style()
 
@@ -281,7 +402,7 @@ class LPSSearchApp:
 
         # Define the darker rectangle (border) surrounding the listing
         outer_frame = tk.Frame(
-            self.scrollable_frame,
+            parent or self.results_frame,
             bg="#c0a1a6",            # Darker pink background for the rectangle
             highlightbackground="#c0a1a6",  # Same as bg for uniformity
             highlightthickness=3     # Visible border thickness
@@ -293,25 +414,12 @@ class LPSSearchApp:
         frame.pack(fill=tk.BOTH, expand=True, padx=0, pady=0)  # No additional padding
 
 
-        # Load and display the image
-        try:
-            if img_url and img_url != "Image Not Available":
-                response = requests.get(img_url, timeout=5)  # Fetch the image from the URL
-                response.raise_for_status()
-                img_data = Image.open(BytesIO(response.content))
-                img_data.thumbnail((100, 100), Image.LANCZOS)  # Resize to thumbnail size
-                photo_image = ImageTk.PhotoImage(img_data)
-            else:
-                # Use a placeholder if the image is not available
-                photo_image = ImageTk.PhotoImage(Image.new("RGB", (100, 100), color="grey"))
-        except Exception as e:
-            logger.error(f"Error loading image from {img_url}: {e}")
-            photo_image = ImageTk.PhotoImage(Image.new("RGB", (100, 100), color="grey"))
-        
-        # Label for the image
-        img_label = ttk.Label(frame, image=photo_image, style="Custom.TLabel")
-        img_label.image = photo_image  # Keep a reference to avoid garbage collection
+        # Label for the image, shows the placeholder until the viewport asks for the real one
+        img_label = ttk.Label(frame, image=self.placeholder_image, style="Custom.TLabel")
+        img_label.image = self.placeholder_image  # Keep a reference to avoid garbage collection
         img_label.pack(side=tk.LEFT, padx=(0, 10))  # Place image with minimal spacing
+        if img_url and img_url != "Image Not Available":
+            self.image_rows[next(self.row_ids)] = {"label": img_label, "frame": outer_frame, "img_url": img_url, "state": "empty"}
         
         # Add text and buttons next to the image
         details_frame = ttk.Frame(frame, style="Custom.TFrame")
@@ -361,4 +469,73 @@ class LPSSearchApp:
         
         # Update the scrollable area to include the new listing
         self.canvas.update_idletasks()
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
\ No newline at end of file
+        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        self.schedule_image_update()
+        return outer_frame
+
+    def schedule_image_update(self):
+        """Coalesce scroll and resize events into one image update per idle cycle."""
+        if not self.image_update_pending:
+            self.image_update_pending = True
+            self.master.after_idle(self.update_images)
+
+    def update_images(self):
+        """Queue, reprioritize, cancel or release row images based on the viewport."""
+        self.image_update_pending = False
+        view_height = max(self.canvas.winfo_height(), 1)
+        view_top = self.canvas.canvasy(0)
+        view_bottom = view_top + view_height
+
+        loaded = []
+        for row_id, row in self.image_rows.items():
+            # Rows live in the alerts or results section, measure from the scrolled frame
+            top = row["frame"].winfo_rooty() - self.scrollable_frame.winfo_rooty()
+            bottom = top + row["frame"].winfo_height()
+            if bottom >= view_top and top <= view_bottom:
+                distance = 0.0
+            else:
+                distance = min(abs(top - view_bottom), abs(view_top - bottom)) / view_height
+
+            if row["state"] == "loaded":
+                loaded.append((distance, row))
+            elif row["state"] == "failed":
+                continue
+            elif row["state"] == "pending" and distance > CANCEL_SCREENS:
+                self.image_loader.cancel(row_id)
+                row["state"] = "empty"
+            elif distance <= PREFETCH_SCREENS or row["state"] == "pending":
+                if row["state"] == "pending" and not self.image_loader.is_pending(row_id):
+                    continue    # Already decoded, waiting in process_images
+                # Visible rows first (priority 0), then by distance, so rows queued
+                # while visible fall behind the new viewport after a scroll
+                priority = 0 if distance == 0 else 1 + round(distance, 1)
+                self.image_loader.request(row_id, row["img_url"], priority)
+                row["state"] = "pending"
+
+        # Over budget: drop the PhotoImages of the rows furthest out of view
+        if len(loaded) > MAX_LOADED_IMAGES:
+            loaded.sort(key=lambda entry: entry[0], reverse=True)
+            for distance, row in loaded[:len(loaded) - MAX_LOADED_IMAGES]:
+                if distance <= CANCEL_SCREENS:
+                    break
+                row["label"].configure(image=self.placeholder_image)
+                row["label"].image = self.placeholder_image
+                row["state"] = "empty"
+
+    def process_images(self):
+        """Show thumbnails decoded by the image loader."""
+        try:
+            while True:
+                row_id, img_data = self.image_loader.done.get_nowait()
+                row = self.image_rows.get(row_id)
+                if row is None or row["state"] != "pending":
+                    continue    # Row cleared or cancelled in the meantime
+                if img_data is None:
+                    row["state"] = "failed"     # Keep the placeholder, do not retry
+                    continue
+                row["state"] = "loaded"
+                photo_image = ImageTk.PhotoImage(img_data)
+                row["label"].configure(image=photo_image)
+                row["label"].image = photo_image
+        except queue.Empty:
+            pass
\ No newline at end of file
@@ -3,7 +3,10 @@ import requests
 import winreg
 import os
 import platform
+import re
 import subprocess
+import threading
+from contextlib import nullcontext
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service as ChromeService
@@ -14,11 +17,16 @@ from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from webdriver_manager.firefox import GeckoDriverManager
+from listings import Listing, parse_price
 
 logger = logging.getLogger(__name__)
 
 # Cache drivers for efficiency reasons
 driver_cache = {"chrome": None, "firefox": None}
+# Searches and watchlist polls share the cached drivers, hold this while using one
+driver_lock = threading.Lock()
+
+ITEM_ID_RE = re.compile(r"/itm/(?:[^/?]+/)?(\d+)")
 
 def is_firefox_installed():
     """Check if Firefox is installed on the system (Windows and Linux)."""
@@ -107,58 +115,180 @@ def is_chrome_installed():
 
     return False
 
+def create_driver(browser):
+    """Start a new headless Selenium WebDriver for the given browser."""
+    if browser == "chrome":
+        if not is_chrome_installed():
+            raise EnvironmentError("Google Chrome is not installed. Please install Google Chrome to use this driver.")
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless")
+        return webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=options)
+    elif browser == "firefox":
+        if not is_firefox_installed():
+            raise EnvironmentError("Firefox is not installed. Please install Firefox to use this driver.")
+        options = webdriver.FirefoxOptions()
+        options.add_argument("--headless")
+        return webdriver.Firefox(service=FirefoxService(GeckoDriverManager().install()), options=options)
+    raise ValueError(f"Unsupported browser: {browser}")
+
 def get_driver(browser):
     """GET or INIT the Selenium WebDriver."""
     global driver_cache
     if driver_cache[browser] is None:
-        if browser == "chrome":
-            if not is_chrome_installed():
-                raise EnvironmentError("Google Chrome is not installed. Please install Google Chrome to use this driver.")
-            options = webdriver.ChromeOptions()
-            options.add_argument("--headless")
-            driver_cache["chrome"] = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=options)
-        elif browser == "firefox":
-            if not is_firefox_installed():
-                raise EnvironmentError("Firefox is not installed. Please install Firefox to use this driver.")
-            options = webdriver.FirefoxOptions()
-            options.add_argument("--headless")
-            driver_cache["firefox"] = webdriver.Firefox(service=FirefoxService(GeckoDriverManager().install()), options=options)
+        driver_cache[browser] = create_driver(browser)
     return driver_cache[browser]
 
-def search_ebay(query, result_queue, stop_event, browser="chrome"):
-    query = requests.utils.quote(query)
-    url = f"https://www.ebay.com/sch/i.html?_from=R40&_nkw={query}&_sacat=0"
+def quit_drivers(browser=None, timeout=5):
+    """Quit the cached driver(s), e.g. on exit or after the driver broke."""
+    if not driver_lock.acquire(timeout=timeout):
+        logger.warning("Driver still in use, not quitting it.")
+        return
     try:
-        driver = get_driver(browser)
-        driver.get(url)
-        soup = BeautifulSoup(driver.page_source, "html.parser")
-        items = soup.find_all("li", class_="s-item")
-        for item in items:
-            if stop_event.is_set():  # Check if the stop event is set
-                logger.info("Search stopped.")
-                return  # Exit the function if the stop event is set
-            try:
-                title = item.find("span", {"role": "heading"}).text.strip()
-                if title == "Shop on eBay": continue
-                price = item.find("span", class_="s-item__price").text.strip()
-                link = item.find("a", class_="s-item__link")["href"]
-
-                # Attempt to fetch image URL
-                img_url = "Image Not Available"
-                if link:
-                    driver.get(link)
-                    try:
-                        wait = WebDriverWait(driver, 0.1)  # Reduced wait time
-                        img_elem = wait.until(EC.presence_of_element_located((By.XPATH, "//img[@data-zoom-src]")))
-                        img_url = img_elem.get_attribute("data-zoom-src")
-                    except TimeoutException:
-                        img_url = "Image Not Available"  # Fallback if the image is not found quickly
-
-                result_queue.put(("eBay", title, price, img_url, link))
-            except Exception as e:
-                logger.error(f"Error processing eBay item: {e}")
-    except Exception as e:
-        logger.error(f"Error fetching eBay results: {e}")
+        for name in ([browser] if browser else list(driver_cache)):
+            if driver_cache[name] is not None:
+                try:
+                    driver_cache[name].quit()
+                except Exception as e:
+                    logger.error(f"Error closing {name} driver: {e}")
+                driver_cache[name] = None
     finally:
-        # Do not quit the driver here, as it is cached for reuse
-        pass
\ No newline at end of file
+        driver_lock.release()
+
+def get_item_id(link):
+    """Extract the eBay item ID from a listing link, or None."""
+    match = ITEM_ID_RE.search(link or "")
+    return match.group(1) if match else None
+
+def parse_listings(page_source):
+    """Yield (item_id, title, price, link) for every listing on a search results page."""
+    soup = BeautifulSoup(page_source, "html.parser")
+    for item in soup.find_all("li", class_="s-item"):
+        try:
+            title = item.find("span", {"role": "heading"}).text.strip()
+            if title == "Shop on eBay": continue
+            price = item.find("span", class_="s-item__price").text.strip()
+            link = item.find("a", class_="s-item__link")["href"]
+        except Exception as e:
+            logger.error(f"Error processing eBay item: {e}")
+            continue
+        yield get_item_id(link), title, price, link
+
+def fetch_image_url(driver, link):
+    """Open a listing page and return its main image URL."""
+    if not link:
+        return "Image Not Available"
+    driver.get(link)
+    try:
+        wait = WebDriverWait(driver, 0.1)  # Reduced wait time
+        img_elem = wait.until(EC.presence_of_element_located((By.XPATH, "//img[@data-zoom-src]")))
+        return img_elem.get_attribute("data-zoom-src")
+    except TimeoutException:
+        return "Image Not Available"  # Fallback if the image is not found quickly
+
+def search_ebay(query, result_queue, stop_event, browser="chrome", driver=None):
+    """Scrape eBay for query and put Listing records on result_queue.
+
+    result_queue is a listings.ResultChannel (or anything with the same
+    put(item, stop_event) method); put blocks while the GUI is behind.
+    If driver is given it is used as-is (e.g. a driver borrowed from the
+    scraper daemon's pool), otherwise the module level cached driver is used.
+
+    Returns True only if every listing was scraped and delivered, False if
+    the search was stopped or anything failed (the driver may be broken).
+    """
+    query = requests.utils.quote(query)
+    url = f"https://www.ebay.com/sch/i.html?_from=R40&_nkw={query}&_sacat=0"
+    ok = True
+    # The cached driver is shared with the watchlist poller, one user at a time
+    with driver_lock if driver is None else nullcontext():
+        try:
+            if driver is None:
+                driver = get_driver(browser)
+            driver.get(url)
+            # Parse the whole page first, the driver navigates away for each image
+            listings = list(parse_listings(driver.page_source))
+            for item_id, title, price, link in listings:
+                if stop_event.is_set():  # Check if the stop event is set
+                    logger.info("Search stopped.")
+                    return False  # Exit the function if the stop event is set
+                try:
+                    img_url = fetch_image_url(driver, link)
+                    if not result_queue.put(Listing("eBay", title, price, img_url, link, item_id), stop_event):
+                        logger.info("Search stopped.")
+                        return False
+                except Exception as e:
+                    logger.error(f"Error processing eBay item: {e}")
+                    ok = False
+        except Exception as e:
+            logger.error(f"Error fetching eBay results: {e}")
+            ok = False
+        finally:
+            # Do not quit the driver here, as it is cached for reuse
+            pass
+    return ok
+
+def poll_newest_listings(query, known_prices, driver, max_new=10):
+    """Incremental poll used by the watchlist.
+
+    Loads the results sorted newly-listed first and collects listings until
+    the first item ID already in known_prices (item_id -> last seen price).
+    Known items still on the same page are price-checked for free.
+
+    max_new caps the listing pages opened per poll, so a poll costs one
+    results page plus at most max_new listing pages. New listings get the
+    budget first and price drops share what is left; drops beyond it are
+    still reported, just without an image. New listings beyond the budget
+    are recorded with a None price ("deferred") and reported by a later poll.
+    The first poll of a query (known_prices empty) only records what is
+    listed already.
+
+    known_prices is updated in place with the prices seen on this poll.
+    Returns (new_listings, price_drops): a list of Listing records and a
+    list of (Listing, old_price) pairs.
+    """
+    query = requests.utils.quote(query)
+    url = f"https://www.ebay.com/sch/i.html?_from=R40&_nkw={query}&_sacat=0&_sop=10"
+    driver.get(url)
+    seeding = not known_prices
+    new_listings, price_drops = [], []
+    reached_known = False
+    deferred = 0
+    for item_id, title, price, link in list(parse_listings(driver.page_source)):
+        if item_id is None:
+            continue
+        if seeding:
+            known_prices[item_id] = price
+            continue
+        old_price = known_prices.get(item_id)
+        if old_price is not None:
+            reached_known = True
+            new_value, old_value = parse_price(price), parse_price(old_price)
+            if new_value is not None and old_value is not None and new_value < old_value:
+                price_drops.append((Listing("eBay", title, price, None, link, item_id), old_price))
+            known_prices[item_id] = price
+            continue
+        if reached_known and item_id not in known_prices:
+            known_prices[item_id] = price   # Older than the last poll, never seen before, not news
+            continue
+        # New since the last poll, or deferred by an earlier one
+        if len(new_listings) < max_new:
+            new_listings.append(Listing("eBay", title, price, None, link, item_id))
+            known_prices[item_id] = price
+        else:
+            known_prices[item_id] = None
+            deferred += 1
+    if deferred:
+        logger.info(f"Watchlist poll budget reached, {deferred} new listing(s) deferred to the next poll")
+
+    # Image pages last, once the results page has been fully read
+    pages_left = max_new
+    for listing in new_listings + [drop[0] for drop in price_drops]:
+        listing.img_url = "Image Not Available"
+        if pages_left <= 0:
+            continue
+        pages_left -= 1
+        try:
+            listing.img_url = fetch_image_url(driver, listing.link)
+        except Exception as e:
+            logger.error(f"Error fetching image for eBay item {listing.item_id}: {e}")
+    return new_listings, price_drops
@@ -0,0 +1,72 @@
+"""Background thumbnail loader with priorities and cancellation."""
+import itertools
+import logging
+import queue
+import threading
+from io import BytesIO
+
+import requests
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (100, 100)
+
+
+class ImageLoader:
+    """Fetch and decode listing thumbnails on worker threads.
+
+    Requests with a lower priority number are served first. A row can be
+    re-requested with a new priority or cancelled at any time; stale queue
+    entries are skipped by the workers. Decoded PIL images are put on
+    self.done as (row_id, image) tuples (image is None on failure) for the
+    Tk thread to turn into PhotoImages, as Tk objects cannot be built here.
+    """
+
+    def __init__(self, workers=4):
+        self.requests = queue.PriorityQueue()
+        self.done = queue.Queue()
+        self.pending = {}   # row_id -> priority of its live request
+        self.lock = threading.Lock()
+        self.counter = itertools.count()    # Tie breaker, keeps FIFO order per priority
+        for _ in range(workers):
+            threading.Thread(target=self.worker, daemon=True).start()
+
+    def request(self, row_id, url, priority):
+        with self.lock:
+            if self.pending.get(row_id) == priority:
+                return  # Already queued like this
+            self.pending[row_id] = priority
+        self.requests.put((priority, next(self.counter), row_id, url))
+
+    def is_pending(self, row_id):
+        with self.lock:
+            return row_id in self.pending
+
+    def cancel(self, row_id):
+        with self.lock:
+            self.pending.pop(row_id, None)
+
+    def cancel_all(self):
+        with self.lock:
+            self.pending.clear()
+
+    def worker(self):
+        while True:
+            priority, _, row_id, url = self.requests.get()
+            with self.lock:
+                if self.pending.get(row_id) != priority:
+                    continue    # Cancelled or re-queued with another priority
+            try:
+                response = requests.get(url, timeout=5)  # Fetch the image from the URL
+                response.raise_for_status()
+                img_data = Image.open(BytesIO(response.content))
+                img_data.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)  # Resize to thumbnail size
+            except Exception as e:
+                logger.error(f"Error loading image from {url}: {e}")
+                img_data = None
+            with self.lock:
+                if row_id not in self.pending:
+                    continue    # Cancelled while downloading
+                del self.pending[row_id]
+            self.done.put((row_id, img_data))
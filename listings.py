@@ -0,0 +1,104 @@
+"""Listing record and the bounded channel that carries listings to the GUI."""
+import queue
+import re
+import sys
+
+PRICE_RE = re.compile(r"\d+(?:\.\d+)?")
+
+# Listings in flight between the scrapers and the Tk thread at most
+RESULT_CHANNEL_SIZE = 200
+
+
+def parse_price(price):
+    """Turn an eBay price string ("$12.99", "$5.00 to $9.00") into a float, or None."""
+    match = PRICE_RE.search((price or "").replace(",", ""))
+    return float(match.group(0)) if match else None
+
+def parse_currency(price):
+    """Return the currency marker in front of the amount ("$", "C $", "GBP"), or ""."""
+    match = PRICE_RE.search(price or "")
+    return (price[:match.start()] if match else "").strip()
+
+
+class Listing:
+    """One search result, shared by the scraper, the daemon, the watchlist and the GUI.
+
+    Uses __slots__ and interned source/currency strings so thousands of
+    listings stay small; memory_size() reports the footprint of one record.
+    """
+    __slots__ = ("source", "item_id", "title", "price", "price_value", "currency", "img_url", "link")
+
+    def __init__(self, source, title, price, img_url, link, item_id=None):
+        self.source = sys.intern(source)
+        self.item_id = item_id
+        self.title = title
+        self.price = price
+        self.price_value = parse_price(price)
+        self.currency = sys.intern(parse_currency(price))
+        self.img_url = img_url
+        self.link = link
+
+    def __repr__(self):
+        return f"Listing({self.source!r}, {self.item_id!r}, {self.title!r}, {self.price!r})"
+
+    def to_dict(self):
+        """Plain dict for JSON (scraper daemon protocol, exports)."""
+        return {"source": self.source, "item_id": self.item_id, "title": self.title,
+                "price": self.price, "img_url": self.img_url, "link": self.link}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a Listing from to_dict() output, re-parsing price and re-interning."""
+        return cls(str(data["source"]), str(data["title"]), str(data["price"]),
+                   data.get("img_url"), str(data["link"]), data.get("item_id"))
+
+    def memory_size(self):
+        """Approximate bytes used by this record, interned strings excluded."""
+        size = sys.getsizeof(self)
+        for name in ("item_id", "title", "price", "price_value", "img_url", "link"):
+            size += sys.getsizeof(getattr(self, name))
+        return size
+
+
+class ResultChannel:
+    """Bounded queue of listings with backpressure and batch put/get.
+
+    put() blocks while the channel is full, so a scraper can never run
+    further ahead of the Tk consumer than maxsize listings. It gives up
+    when stop_event is set so a cancelled search does not hang.
+    """
+
+    def __init__(self, maxsize=RESULT_CHANNEL_SIZE):
+        self.queue = queue.Queue(maxsize)
+
+    def put(self, item, stop_event=None):
+        """Block until item fits. Return False if stop_event was set first."""
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                return False
+            try:
+                self.queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+
+    def put_many(self, items, stop_event=None):
+        """Put items in order, blocking as put() does. Return False if stop_event was set first."""
+        for item in items:
+            if not self.put(item, stop_event):
+                return False
+        return True
+
+    def get_batch(self, max_items):
+        """Return up to max_items listings without blocking."""
+        batch = []
+        try:
+            while len(batch) < max_items:
+                batch.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def clear(self):
+        while self.get_batch(self.queue.maxsize or 100):
+            pass
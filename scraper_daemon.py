@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""Local scraper daemon shared by several LPS app instances.
+
+Run it once per user:
+
+    python scraper_daemon.py --browser firefox --pool-size 2
+
+It keeps a warm pool of Selenium drivers plus a small result cache, and
+streams the same listings.Listing records that LPSSearchApp.process_queue
+consumes back, as JSON, over a per-user local socket (a named pipe on
+Windows) guarded by a random authkey. The GUI picks it up automatically
+when it is running. A client that falls behind stops reading, which in turn
+blocks the daemon's sends, so backpressure reaches the scraper.
+"""
+import argparse
+import getpass
+import hmac
+import json
+import logging
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client, Connection
+
+from listings import Listing
+
+logger = logging.getLogger(__name__)
+
+# Per-user channel: a unix socket in a 0700 directory, or a per-user named
+# pipe on Windows, plus a random authkey in a 0600 file only this user can read
+RUNTIME_DIR = os.path.join(os.path.expanduser("~"), ".lps")
+AUTHKEY_FILE = os.path.join(RUNTIME_DIR, "daemon.key")
+if sys.platform == "win32":
+    DAEMON_ADDRESS = r"\\.\pipe\lps-scraper-" + getpass.getuser()
+else:
+    DAEMON_ADDRESS = os.path.join(RUNTIME_DIR, "daemon.sock")
+
+BROWSERS = ("chrome", "firefox")
+READ_BATCH = 50                 # Listings read off the connection before handing them on in one go
+MAX_MESSAGE_SIZE = 1024 * 1024  # Bytes, nothing legitimate comes close
+
+# Seconds before an unresponsive peer counts as gone, or the daemon as not running
+CONNECT_TIMEOUT = 2
+HANDSHAKE_TIMEOUT = 2
+POLL_TIMEOUT = 120              # A watchlist poll opens up to a results page plus its listing pages
+
+# How long a finished search is served from the cache (seconds), and how many are kept
+RESULT_CACHE_TTL = 600
+RESULT_CACHE_SIZE = 50
+
+
+# PROTOCOL, JSON messages only, never pickles
+def send_message(conn, message):
+    conn.send_bytes(json.dumps(message).encode("utf-8"))
+
+def recv_message(conn, timeout=None):
+    """Receive one JSON message, raises TimeoutError if none arrives within timeout."""
+    if timeout is not None and not conn.poll(timeout):
+        raise TimeoutError("no answer from the other side of the scraper daemon connection")
+    return json.loads(conn.recv_bytes(MAX_MESSAGE_SIZE).decode("utf-8"))
+
+def _sign(authkey, role, nonce):
+    return hmac.new(authkey, role + nonce, "sha256").digest()
+
+def _recv_handshake(conn):
+    if not conn.poll(HANDSHAKE_TIMEOUT):
+        raise TimeoutError("scraper daemon handshake timed out")
+    return conn.recv_bytes(256)
+
+# Mutual challenge/response on the authkey. Done by hand, with timeouts, instead
+# of by Listener.accept(), so one stuck client cannot block the accept loop.
+def server_handshake(conn, authkey):
+    nonce = os.urandom(32)
+    conn.send_bytes(nonce)
+    reply = _recv_handshake(conn)
+    digest, client_nonce = reply[:32], reply[32:]
+    if len(client_nonce) != 32 or not hmac.compare_digest(digest, _sign(authkey, b"client", nonce)):
+        raise AuthenticationError("client failed the authkey challenge")
+    conn.send_bytes(_sign(authkey, b"daemon", client_nonce))
+
+def client_handshake(conn, authkey):
+    nonce = _recv_handshake(conn)
+    if len(nonce) != 32:
+        raise AuthenticationError("bad challenge from scraper daemon")
+    client_nonce = os.urandom(32)
+    conn.send_bytes(_sign(authkey, b"client", nonce) + client_nonce)
+    if not hmac.compare_digest(_recv_handshake(conn), _sign(authkey, b"daemon", client_nonce)):
+        raise AuthenticationError("scraper daemon failed the authkey challenge")
+
+def read_authkey():
+    """Return the running daemon's authkey, raises OSError if there is none."""
+    with open(AUTHKEY_FILE, "rb") as f:
+        return f.read()
+
+def ensure_runtime_dir():
+    """Create ~/.lps, readable by this user only."""
+    os.makedirs(RUNTIME_DIR, mode=0o700, exist_ok=True)
+    os.chmod(RUNTIME_DIR, 0o700)
+
+def create_authkey():
+    """Write a fresh random authkey readable by this user only."""
+    ensure_runtime_dir()
+    authkey = os.urandom(32)
+    fd = os.open(AUTHKEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.chmod(AUTHKEY_FILE, 0o600)   # In case the file already existed
+    with os.fdopen(fd, "wb") as f:
+        f.write(authkey)
+    return authkey
+
+def connect():
+    """Open an authenticated connection, raises OSError/AuthenticationError on failure."""
+    authkey = read_authkey()
+    if sys.platform == "win32":
+        conn = Client(DAEMON_ADDRESS)
+    else:
+        # Plain socket first, Client() has no connect timeout
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(DAEMON_ADDRESS)
+            sock.setblocking(True)
+        except OSError:
+            sock.close()
+            raise
+        conn = Connection(sock.detach())
+    try:
+        client_handshake(conn, authkey)
+    except Exception:
+        conn.close()
+        raise
+    return conn
+# END OF PROTOCOL
+
+
+# CLIENT SIDE
+def is_daemon_running():
+    """Return True if this user's scraper daemon answers.
+
+    Gives up after a few seconds at most (a stuck daemon counts as not
+    running), still better called off the Tk thread.
+    """
+    try:
+        with connect() as conn:
+            send_message(conn, {"cmd": "ping"})
+            return recv_message(conn, HANDSHAKE_TIMEOUT) == "pong"
+    except (OSError, EOFError):
+        return False
+    except Exception as e:
+        logger.debug(f"Scraper daemon ping failed: {e}")
+        return False
+
+def search_via_daemon(query, result_queue, stop_event, browser="chrome"):
+    """Drop-in replacement for ebay_scraper.search_ebay that asks the daemon."""
+    try:
+        with connect() as conn:
+            send_message(conn, {"cmd": "search", "query": query, "browser": browser})
+            finished = False
+            while not finished:
+                if stop_event.is_set():
+                    logger.info("Search stopped.")
+                    return  # Closing the connection tells the daemon to stop too
+                # Read whatever burst has arrived, then hand it on as one batch
+                batch = []
+                while len(batch) < READ_BATCH and conn.poll(0 if batch else 0.2):
+                    result = recv_message(conn)
+                    if result is None:
+                        finished = True  # Daemon finished streaming this search
+                        break
+                    batch.append(Listing.from_dict(result))
+                if not result_queue.put_many(batch, stop_event):
+                    logger.info("Search stopped.")
+                    return
+    except (OSError, EOFError) as e:
+        logger.error(f"Lost connection to scraper daemon: {e}")
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f"Bad message from scraper daemon: {e}")
+
+def poll_via_daemon(query, known_prices, max_new, browser="chrome"):
+    """Run ebay_scraper.poll_newest_listings on the daemon's shared drivers.
+
+    Same contract, known_prices is updated in place. Raises OSError if the
+    daemon cannot be reached or the poll failed there.
+    """
+    with connect() as conn:
+        send_message(conn, {"cmd": "poll", "query": query, "known": known_prices,
+                            "max_new": max_new, "browser": browser})
+        reply = recv_message(conn, POLL_TIMEOUT)
+    if not isinstance(reply, dict) or "error" in reply:
+        raise OSError(f"Scraper daemon poll failed: {reply.get('error') if isinstance(reply, dict) else reply}")
+    known_prices.clear()
+    known_prices.update(reply["known"])
+    return ([Listing.from_dict(data) for data in reply["new"]],
+            [(Listing.from_dict(data), old_price) for data, old_price in reply["drops"]])
+
+def search(query, result_queue, stop_event, browser="chrome"):
+    """Search thread target: use the daemon if it is running, else scrape in-process.
+
+    Ends the search with a None marker on result_queue (unless it was stopped).
+    """
+    try:
+        if is_daemon_running():
+            logger.info("Using running scraper daemon.")
+            search_via_daemon(query, result_queue, stop_event, browser)
+        else:
+            import ebay_scraper
+            ebay_scraper.search_ebay(query, result_queue, stop_event, browser)
+    except Exception as e:
+        logger.error(f"Error in search thread: {e}")
+    finally:
+        result_queue.put(None, stop_event)
+# END OF CLIENT SIDE
+
+
+# DAEMON SIDE
+class DriverPool:
+    """Fixed size pool of warm drivers per browser, created lazily."""
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.idle = {}      # browser -> queue.Queue of idle drivers
+        self.created = {}   # browser -> number of drivers started
+
+    def acquire(self, browser):
+        import ebay_scraper
+        while True:
+            with self.lock:
+                idle = self.idle.setdefault(browser, queue.Queue())
+                start_new = idle.empty() and self.created.get(browser, 0) < self.size
+                if start_new:
+                    self.created[browser] = self.created.get(browser, 0) + 1
+            if start_new:
+                logger.info(f"Starting {browser} driver #{self.created[browser]}")
+                try:
+                    return ebay_scraper.create_driver(browser)
+                except Exception:
+                    with self.lock:
+                        self.created[browser] -= 1
+                    raise
+            try:
+                # Wait for another request to hand one back, re-check in case one was discarded
+                return idle.get(timeout=1)
+            except queue.Empty:
+                continue
+
+    def release(self, browser, driver):
+        self.idle[browser].put(driver)
+
+    def discard(self, browser, driver):
+        """Quit a driver that failed instead of handing it out again."""
+        logger.warning(f"Discarding failed {browser} driver.")
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.error(f"Error closing {browser} driver: {e}")
+        with self.lock:
+            self.created[browser] -= 1
+
+    def close(self):
+        for browser, idle in self.idle.items():
+            while not idle.empty():
+                try:
+                    idle.get_nowait().quit()
+                except Exception as e:
+                    logger.error(f"Error closing {browser} driver: {e}")
+
+
+class _ConnectionQueue:
+    """Queue-like wrapper so search_ebay can stream straight to a client."""
+
+    def __init__(self, conn, stop_event):
+        self.conn = conn
+        self.stop_event = stop_event
+        self.sent = []
+
+    def put(self, item, stop_event=None):
+        data = item.to_dict()
+        try:
+            send_message(self.conn, data)
+            self.sent.append(data)
+            return True
+        except (OSError, EOFError):
+            self.stop_event.set()   # Client went away, stop scraping for it
+            return False
+
+
+class ScraperDaemon:
+    def __init__(self, pool_size=2, default_browser="chrome"):
+        self.authkey = None
+        self.pool = DriverPool(pool_size)
+        self.default_browser = default_browser
+        self.cache = {}     # (browser, query) -> (timestamp, [listing dicts])
+        self.cache_lock = threading.Lock()
+
+    def cached_results(self, key):
+        with self.cache_lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > RESULT_CACHE_TTL:
+                del self.cache[key]
+                return None
+            return entry[1]
+
+    def cache_results(self, key, results):
+        with self.cache_lock:
+            now = time.time()
+            # Sweep expired searches, then drop the oldest if still full
+            for old_key in [k for k, entry in self.cache.items() if now - entry[0] > RESULT_CACHE_TTL]:
+                del self.cache[old_key]
+            while len(self.cache) >= RESULT_CACHE_SIZE:
+                del self.cache[min(self.cache, key=lambda k: self.cache[k][0])]
+            self.cache[key] = (now, results)
+
+    def handle_search(self, conn, query, browser):
+        import ebay_scraper
+        key = (browser, query)
+        cached = self.cached_results(key)
+        if cached is not None:
+            logger.info(f"Serving cached results for: {query}")
+            for data in cached:
+                send_message(conn, data)
+            send_message(conn, None)
+            return
+
+        stop_event = threading.Event()
+        out = _ConnectionQueue(conn, stop_event)
+        driver = self.pool.acquire(browser)
+        try:
+            ok = ebay_scraper.search_ebay(query, out, stop_event, browser, driver=driver)
+        except Exception as e:
+            logger.error(f"Error in daemon search: {e}")
+            ok = False
+        if ok or stop_event.is_set():
+            self.pool.release(browser, driver)  # Finished, or the client went away
+        else:
+            self.pool.discard(browser, driver)  # Scrape failed, the driver may be broken
+        if ok:
+            self.cache_results(key, out.sent)
+        if not stop_event.is_set():
+            send_message(conn, None)
+
+    def handle_poll(self, conn, query, known, max_new, browser):
+        import ebay_scraper
+        driver = self.pool.acquire(browser)
+        try:
+            new_listings, price_drops = ebay_scraper.poll_newest_listings(query, known, driver, max_new)
+        except Exception as e:
+            logger.error(f"Error in daemon poll: {e}")
+            self.pool.discard(browser, driver)
+            send_message(conn, {"error": str(e)})
+            return
+        self.pool.release(browser, driver)
+        send_message(conn, {"new": [listing.to_dict() for listing in new_listings],
+                            "drops": [[listing.to_dict(), old_price] for listing, old_price in price_drops],
+                            "known": known})
+
+    def handle_client(self, conn):
+        try:
+            with conn:
+                server_handshake(conn, self.authkey)
+                request = recv_message(conn, HANDSHAKE_TIMEOUT)
+                if not isinstance(request, dict):
+                    raise ValueError("request is not an object")
+                cmd = request.get("cmd")
+                if cmd == "ping":
+                    send_message(conn, "pong")
+                    return
+                if cmd not in ("search", "poll"):
+                    logger.warning(f"Unknown daemon command: {cmd}")
+                    return
+                query = str(request["query"])
+                browser = request.get("browser")
+                if browser not in BROWSERS:
+                    browser = self.default_browser
+                if cmd == "search":
+                    logger.info(f"Daemon search ({browser}): {query}")
+                    self.handle_search(conn, query, browser)
+                elif cmd == "poll":
+                    known = {str(item_id): None if price is None else str(price)
+                             for item_id, price in dict(request["known"]).items()}
+                    logger.info(f"Daemon watchlist poll ({browser}): {query}")
+                    self.handle_poll(conn, query, known, max(0, int(request["max_new"])), browser)
+        except (OSError, EOFError) as e:
+            logger.debug(f"Client disconnected: {e}")
+        except AuthenticationError as e:
+            logger.warning(f"Rejected daemon connection: {e}")
+        except Exception as e:
+            logger.error(f"Error handling daemon client: {e}")
+
+    def serve_forever(self):
+        if is_daemon_running():
+            logger.error("A scraper daemon is already running for this user.")
+            return
+        self.authkey = create_authkey()
+        if sys.platform != "win32" and os.path.exists(DAEMON_ADDRESS):
+            os.unlink(DAEMON_ADDRESS)   # Left behind by a daemon that did not exit cleanly
+        # No authkey on the Listener: accept() only accepts, the handshake runs in handle_client
+        with Listener(DAEMON_ADDRESS, backlog=16) as listener:
+            logger.info(f"Scraper daemon listening on {DAEMON_ADDRESS}")
+            try:
+                while True:
+                    try:
+                        conn = listener.accept()
+                    except Exception as e:
+                        logger.error(f"Rejected daemon connection: {e}")
+                        continue
+                    threading.Thread(target=self.handle_client, args=(conn,), daemon=True).start()
+            except KeyboardInterrupt:
+                logger.info("Stopping scraper daemon...")
+            finally:
+                self.pool.close()
+                try:
+                    os.remove(AUTHKEY_FILE)
+                except OSError:
+                    pass
+# END OF DAEMON SIDE
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='LPS scraper daemon')
+    parser.add_argument('-d', action='store_true', help='Enable debug logging')
+    parser.add_argument('--browser', choices=['chrome', 'firefox'], default='chrome', help='Browser used when a client does not ask for one')
+    parser.add_argument('--pool-size', type=int, default=2, help='Maximum number of warm drivers per browser')
+    daemon_args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if daemon_args.d else logging.INFO,
+                        format='%(levelname)s - %(asctime)s - %(message)s')
+    ScraperDaemon(daemon_args.pool_size, daemon_args.browser).serve_forever()
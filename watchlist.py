@@ -0,0 +1,214 @@
+"""Watchlist of saved LPS queries, polled in the background for new listings."""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import scraper_daemon
+
+logger = logging.getLogger(__name__)
+
+# Per user, next to the scraper daemon's socket and key
+WATCHLIST_FILE = os.path.join(scraper_daemon.RUNTIME_DIR, "watchlist.json")
+
+DEFAULT_INTERVAL = 30 * 60      # Seconds between polls of the same query
+MIN_POLL_GAP = 60               # Seconds between any two polls, however many pets or app instances
+MAX_NEW_PER_POLL = 10           # Listing pages opened per poll at most
+MAX_KNOWN_IDS = 500             # Item IDs remembered per query
+
+LOCK_TIMEOUT = 5                # Seconds to wait for another instance to finish writing
+STALE_LOCK_AGE = 30             # Seconds after which a lock file is assumed left behind by a crash
+
+
+class Watchlist:
+    """Saved queries with the item IDs and prices seen on previous polls.
+
+    ~/.lps/watchlist.json is the only copy, shared by every app instance of
+    this user. Each change re-reads it, applies the change and atomically
+    replaces it while holding a lock file, so instances never overwrite each
+    other's watches and a crash mid-write cannot leave a truncated file behind.
+    """
+
+    def __init__(self, path=WATCHLIST_FILE):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def locked(self):
+        """Hold the watchlist against other threads and other app instances."""
+        with self.lock:
+            deadline = time.time() + LOCK_TIMEOUT
+            while True:
+                try:
+                    os.close(os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                    break
+                except FileExistsError:
+                    try:
+                        if time.time() - os.path.getmtime(self.lock_path) > STALE_LOCK_AGE:
+                            os.remove(self.lock_path)
+                            continue
+                    except OSError:
+                        continue    # Released meanwhile, try again
+                    if time.time() > deadline:
+                        raise TimeoutError(f"Watchlist is locked: {self.lock_path}")
+                    time.sleep(0.05)
+            try:
+                yield
+            finally:
+                try:
+                    os.remove(self.lock_path)
+                except OSError:
+                    pass
+
+    def read(self):
+        """Return the saved entries, raises OSError/ValueError if the file is unreadable."""
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        if not isinstance(entries, dict):
+            raise ValueError("watchlist is not a JSON object")
+        return entries
+
+    def write(self, entries):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def update(self, change):
+        """Apply change(entries) to the saved watchlist and return its result.
+
+        Returns None if the file could not be read or written. A corrupt file
+        is left untouched rather than replaced by an empty watchlist.
+        """
+        try:
+            if self.path == WATCHLIST_FILE:
+                scraper_daemon.ensure_runtime_dir()
+            with self.locked():
+                entries = self.read()
+                before = json.dumps(entries, sort_keys=True)
+                result = change(entries)
+                if json.dumps(entries, sort_keys=True) != before:
+                    self.write(entries)
+                return result
+        except (OSError, ValueError) as e:
+            logger.error(f"Error updating watchlist {self.path}: {e}")
+            return None
+
+    def queries(self):
+        try:
+            return sorted(self.read())
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading watchlist from {self.path}: {e}")
+            return []
+
+    def add(self, query, interval=DEFAULT_INTERVAL):
+        def change(entries):
+            entry = entries.setdefault(query, {"interval": interval, "last_poll": 0, "known": {}})
+            entry["interval"] = interval
+            return True
+        if self.update(change):
+            logger.info(f"Watching: {query} (every {interval // 60} min)")
+
+    def remove(self, query):
+        """Stop watching query, returns True if it was watched."""
+        if self.update(lambda entries: entries.pop(query, None) is not None):
+            logger.info(f"Stopped watching: {query}")
+            return True
+        return False
+
+    def claim_due(self):
+        """Claim the most overdue query for polling.
+
+        Returns (query, known_prices, 0), or (None, None, seconds to wait)
+        if nothing is due. Claiming stamps last_poll right away, so other
+        instances skip the query, and no query is due sooner than
+        MIN_POLL_GAP after the last poll by any instance.
+        """
+        def claim(entries):
+            if not entries:
+                return None, None, MIN_POLL_GAP
+            now = time.time()
+            last_any = max(entry["last_poll"] for entry in entries.values())
+            query, entry = min(entries.items(), key=lambda e: e[1]["last_poll"] + e[1]["interval"])
+            due = max(entry["last_poll"] + entry["interval"], last_any + MIN_POLL_GAP)
+            if due > now:
+                return None, None, due - now
+            entry["last_poll"] = now
+            return query, dict(entry["known"]), 0
+        return self.update(claim) or (None, None, MIN_POLL_GAP)
+
+    def record_poll(self, query, known):
+        def change(entries):
+            if query in entries:    # Might have been unwatched meanwhile
+                entries[query]["known"] = known
+        self.update(change)
+
+
+class WatchlistScheduler(threading.Thread):
+    """Background poller for a Watchlist.
+
+    Polls one query at a time, most overdue first, and never more often than
+    every MIN_POLL_GAP seconds overall, so the scrape volume stays bounded no
+    matter how many queries are watched or app instances run (intervals simply
+    stretch). Polls go through the scraper daemon's shared drivers when it is
+    running, otherwise through the app's own cached search driver, so no extra
+    browser is started. Alerts are put on alert_queue as
+    ("new" | "price_drop", query, listing, old_price) tuples, old_price being
+    None for new listings.
+    """
+
+    def __init__(self, watchlist, alert_queue, stop_event, browser="chrome"):
+        super().__init__(daemon=True)
+        self.watchlist = watchlist
+        self.alert_queue = alert_queue
+        self.stop_event = stop_event
+        self.browser = browser
+
+    def run(self):
+        while not self.stop_event.is_set():
+            query, known, wait = self.watchlist.claim_due()
+            if query is None:
+                # Re-check at least every MIN_POLL_GAP, queries may have been added
+                self.stop_event.wait(min(wait, MIN_POLL_GAP))
+                continue
+            self.poll(query, known)
+
+    def poll(self, query, known):
+        import ebay_scraper
+        logger.debug(f"Polling watchlist query: {query}")
+        use_daemon = scraper_daemon.is_daemon_running()
+        try:
+            if use_daemon:
+                new_listings, price_drops = scraper_daemon.poll_via_daemon(query, known, MAX_NEW_PER_POLL, self.browser)
+            else:
+                with ebay_scraper.driver_lock:
+                    started_driver = ebay_scraper.driver_cache[self.browser] is None
+                    driver = ebay_scraper.get_driver(self.browser)
+                    new_listings, price_drops = ebay_scraper.poll_newest_listings(query, known, driver, MAX_NEW_PER_POLL)
+                if started_driver:
+                    # Polls are MIN_POLL_GAP apart at least, do not keep a browser idling for them
+                    ebay_scraper.quit_drivers(self.browser)
+        except Exception as e:
+            logger.error(f"Error polling watchlist query {query}: {e}")
+            if not use_daemon:
+                ebay_scraper.quit_drivers(self.browser)    # May be broken, start a fresh one next time
+            return
+
+        # Forget the oldest IDs so a long running watch stays small
+        while len(known) > MAX_KNOWN_IDS:
+            del known[next(iter(known))]
+        self.watchlist.record_poll(query, known)
+
+        for listing in new_listings:
+            self.alert_queue.put(("new", query, listing, None))
+        for listing, old_price in price_drops:
+            self.alert_queue.put(("price_drop", query, listing, old_price))
+        if new_listings or price_drops:
+            logger.info(f"Watchlist {query}: {len(new_listings)} new, {len(price_drops)} price drops")